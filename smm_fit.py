@@ -7,118 +7,45 @@ for watching-after-scroll, watching-after-like, and watching-after-dubious.
 
 Expected CSV format:
 - timestamp (float): Time in seconds
-- event (string): One of 'scroll', 'like', 'dubious_scroll'
+- event (string): One of 'scroll', 'like', 'dubious_scroll'; case and
+  surrounding whitespace are ignored, other values are skipped
+
+A Parquet file with the same columns is also accepted and loads faster;
+run once with --to-parquet to convert a CSV log.
 """
 
-import csv
+import os
 import sys
 import logging
 import argparse
-from collections import Counter
-
-
-def load_data(filename):
-    """Load timestamped events from CSV file."""
-    events = []
-    try:
-        with open(filename, "r") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                timestamp = float(row["timestamp"])
-                event = row["event"].strip().lower()
-                events.append((timestamp, event))
-    except FileNotFoundError:
-        logging.error(f"File '{filename}' not found.")
-        sys.exit(1)
-    except KeyError as e:
-        logging.error(f"Required column {e} not found in CSV.")
-        sys.exit(1)
-    except ValueError as e:
-        logging.error(f"Error parsing CSV: {e}")
-        sys.exit(1)
-
-    events.sort(key=lambda x: x[0])
-    return events
-
-
-def analyze_state_dependent_behavior(events):
-    """Analyze behavior based on previous action state."""
-    if len(events) < 2:
-        logging.error("Need at least 2 events to analyze transitions.")
-        sys.exit(1)
-
-    valid_events = ["scroll", "like", "dubious_scroll"]
-
-    # Store dwell times and next actions for each previous state
-    state_data = {
-        "scroll": {"dwell_times": [], "next_actions": []},
-        "like": {"dwell_times": [], "next_actions": []},
-        "dubious_scroll": {"dwell_times": [], "next_actions": []},
-    }
-
-    # Analyze transitions between consecutive events
-    for i in range(1, len(events)):
-        prev_time, prev_action = events[i - 1]
-        curr_time, curr_action = events[i]
-
-        if prev_action in valid_events and curr_action in valid_events:
-            dwell_time = curr_time - prev_time
-            if dwell_time > 0:
-                state_data[prev_action]["dwell_times"].append(dwell_time)
-                state_data[prev_action]["next_actions"].append(curr_action)
-
-    return state_data
-
-
-def calculate_state_parameters(state_data):
-    """Calculate parameters for each state."""
-    parameters = {}
-
-    for state_name, data in state_data.items():
-        if not data["dwell_times"]:
-            logging.warning(f"No data for state '{state_name}', using defaults")
-            parameters[state_name] = {
-                "mean_dwell": 2.0,
-                "rate": 0.5,
-                "transition_probs": {"scroll": 0.6, "like": 0.2, "dubious_scroll": 0.2},
-                "cumulative_probs": {"scroll": 0.6, "like": 0.8, "dubious_scroll": 1.0},
-            }
-            continue
-
-        # Calculate dwell time parameters
-        mean_dwell = sum(data["dwell_times"]) / len(data["dwell_times"])
-        rate = 1.0 / mean_dwell
-
-        # Calculate transition probabilities
-        action_counts = Counter(data["next_actions"])
-        total_actions = len(data["next_actions"])
-
-        transition_probs = {}
-        for action in ["scroll", "like", "dubious_scroll"]:
-            transition_probs[action] = action_counts[action] / total_actions
-
-        # Calculate cumulative probabilities
-        cumulative_probs = {
-            "scroll": transition_probs["scroll"],
-            "like": transition_probs["scroll"] + transition_probs["like"],
-            "dubious_scroll": 1.0,
-        }
-
-        parameters[state_name] = {
-            "mean_dwell": mean_dwell,
-            "rate": rate,
-            "transition_probs": transition_probs,
-            "cumulative_probs": cumulative_probs,
-            "sample_size": len(data["dwell_times"]),
-        }
-
-    return parameters
-
 
-def generate_cpp_constants(parameters):
-    """Generate C++ header with state-dependent parameters."""
-
-    cpp_content = """// Semi-Markov Model Parameters with State Memory
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import csv as pacsv
+
+EVENT_CODES = {"scroll": 0, "like": 1, "dubious_scroll": 2}
+EVENT_NAMES = list(EVENT_CODES)
+
+# Used for states that never occur in the data
+DEFAULT_MEAN_DWELL = 2.0
+DEFAULT_TRANSITION_PROBS = np.array([0.6, 0.2, 0.2])
+
+# Arrow parses CSV in blocks of this many bytes, roughly 500k events each
+CSV_READ_OPTIONS = pacsv.ReadOptions(block_size=8 << 20)
+# No null markers, so an empty timestamp is a parse error rather than NaN
+CSV_CONVERT_OPTIONS = pacsv.ConvertOptions(
+    include_columns=["timestamp", "event"],
+    null_values=[],
+    column_types={
+        "timestamp": pa.float64(),
+        "event": pa.dictionary(pa.int32(), pa.string()),
+    },
+)
+
+# Pieces of the generated smm_parameters.h, see generate_cpp_constants
+CPP_HEADER = """// Semi-Markov Model Parameters with State Memory
 // Auto-generated from interaction data
 
 #ifndef SMM_PARAMETERS_H
@@ -136,28 +63,24 @@ def generate_cpp_constants(parameters):
 
 """
 
-    # Generate parameters for each state
-    state_names = ["scroll", "like", "dubious_scroll"]
-    state_defines = ["SCROLL", "LIKE", "DUBIOUS"]
-
-    for i, (state_name, state_define) in enumerate(zip(state_names, state_defines)):
-        params = parameters[state_name]
-        cpp_content += f"""
-// Parameters for WATCHING_AFTER_{state_define} state
-const float MEAN_DWELL_AFTER_{state_define} = {params['mean_dwell']:.6f}f;
-const float DWELL_RATE_AFTER_{state_define} = {params['rate']:.6f}f;
+# Parameters of one WATCHING_AFTER_* state, indexed by next action code and
+# pre-formatted by format_cpp_float
+CPP_PER_STATE_TEMPLATE = """
+// Parameters for WATCHING_AFTER_{define} state
+const float MEAN_DWELL_AFTER_{define} = {mean_dwell}f;
+const float DWELL_RATE_AFTER_{define} = {rate}f;
 
-const float PROB_SCROLL_AFTER_{state_define} = {params['transition_probs']['scroll']:.6f}f;
-const float PROB_LIKE_AFTER_{state_define} = {params['transition_probs']['like']:.6f}f;
-const float PROB_DUBIOUS_AFTER_{state_define} = {params['transition_probs']['dubious_scroll']:.6f}f;
+const float PROB_SCROLL_AFTER_{define} = {transition_probs[0]}f;
+const float PROB_LIKE_AFTER_{define} = {transition_probs[1]}f;
+const float PROB_DUBIOUS_AFTER_{define} = {transition_probs[2]}f;
 
-const float CUM_PROB_SCROLL_AFTER_{state_define} = {params['cumulative_probs']['scroll']:.6f}f;
-const float CUM_PROB_LIKE_AFTER_{state_define} = {params['cumulative_probs']['like']:.6f}f;
-const float CUM_PROB_DUBIOUS_AFTER_{state_define} = {params['cumulative_probs']['dubious_scroll']:.6f}f;
+const float CUM_PROB_SCROLL_AFTER_{define} = {cumulative_probs[0]}f;
+const float CUM_PROB_LIKE_AFTER_{define} = {cumulative_probs[1]}f;
+const float CUM_PROB_DUBIOUS_AFTER_{define} = {cumulative_probs[2]}f;
 """
 
-    # Create lookup arrays for efficient access
-    cpp_content += """
+# Lookup arrays indexed by state, closing the header
+CPP_FOOTER = """
 // Lookup arrays for efficient state-dependent parameter access
 const float MEAN_DWELL_BY_STATE[3] = {
     MEAN_DWELL_AFTER_SCROLL,
@@ -186,32 +109,282 @@ const float CUM_PROB_LIKE_BY_STATE[3] = {
 #endif // SMM_PARAMETERS_H
 """
 
-    return cpp_content
+
+def encode_events(events):
+    """Map a dictionary-encoded event array to int8 EVENT_CODES, -1 if unknown.
+
+    One byte per event keeps the code arrays small and every later step
+    works on integers instead of strings.
+    """
+    # Normalizing the dictionary only touches the handful of distinct names
+    names = pc.utf8_lower(pc.utf8_trim_whitespace(events.dictionary))
+    # Missing events point one past the dictionary, at an extra -1
+    lookup = np.array(
+        [EVENT_CODES.get(name, -1) for name in names.to_pylist()] + [-1],
+        dtype=np.int8,
+    )
+    indices = pc.fill_null(events.indices, len(events.dictionary))
+    return lookup[indices.to_numpy()]
+
+
+def new_accumulators():
+    """Return zeroed (trans_counts, dwell_sum, dwell_count) accumulators.
+
+    trans_counts[i, j] counts transitions from action i to action j, while
+    dwell_sum[i] and dwell_count[i] total the dwell times spent after i.
+    """
+    return (
+        np.zeros((3, 3), dtype=np.int64),
+        np.zeros(3, dtype=np.float64),
+        np.zeros(3, dtype=np.int64),
+    )
+
+
+def add_transitions(timestamps, codes, trans_counts, dwell_sum, dwell_count):
+    """Add the transitions between consecutive events to the accumulators."""
+    dwell = np.diff(timestamps)
+    prev = codes[:-1]
+    curr = codes[1:]
+    valid = (prev >= 0) & (curr >= 0) & (dwell > 0)
+    prev, curr, dwell = prev[valid], curr[valid], dwell[valid]
+
+    # Flat index prev * 3 + curr counts every cell of the matrix in one pass
+    trans_counts += np.bincount(prev * 3 + curr, minlength=9).reshape(3, 3)
+    dwell_sum += np.bincount(prev, weights=dwell, minlength=3)
+    dwell_count += np.bincount(prev, minlength=3)
+
+
+def stream_transitions(filename, assume_sorted=False, parquet_filename=None):
+    """Accumulate transition statistics block by block over the CSV file.
+
+    Only running sums and counts per previous state are kept, so memory use
+    does not grow with the file. Returns (trans_counts, dwell_sum,
+    dwell_count), or None if the timestamps are not in chronological order.
+    With assume_sorted the order is not checked and out-of-order events are
+    simply skipped like any other non-positive dwell time.
+
+    With parquet_filename every block is also written to that Parquet file,
+    so converting the log takes no extra pass over the CSV. The whole file
+    is then read even when it turns out to be out of order.
+    """
+    trans_counts, dwell_sum, dwell_count = new_accumulators()
+
+    num_events = 0
+    in_order = True
+    last_time = np.empty(0, dtype=np.float64)
+    last_code = np.empty(0, dtype=np.int8)
+    writer = None
+    completed = False
+    try:
+        reader = pacsv.open_csv(
+            filename,
+            read_options=CSV_READ_OPTIONS,
+            convert_options=CSV_CONVERT_OPTIONS,
+        )
+        for batch in reader:
+            if batch.num_rows == 0:
+                continue
+            num_events += batch.num_rows
+            if parquet_filename is not None:
+                if writer is None:
+                    writer = pq.ParquetWriter(parquet_filename, batch.schema)
+                writer.write_batch(batch)
+            if not in_order:
+                continue
+
+            timestamps = batch.column("timestamp").to_numpy(zero_copy_only=False)
+            codes = encode_events(batch.column("event"))
+
+            # Carry the last event over so the transition across the block
+            # boundary is counted too
+            timestamps = np.concatenate((last_time, timestamps))
+            codes = np.concatenate((last_code, codes))
+            if not assume_sorted and np.any(timestamps[1:] < timestamps[:-1]):
+                if parquet_filename is None:
+                    return None
+                in_order = False
+                continue
+
+            add_transitions(timestamps, codes, trans_counts, dwell_sum, dwell_count)
+            last_time, last_code = timestamps[-1:], codes[-1:]
+        completed = True
+    except FileNotFoundError:
+        logging.error(f"File '{filename}' not found.")
+        sys.exit(1)
+    except KeyError as e:
+        logging.error(f"Required column missing from {filename}: {e}")
+        sys.exit(1)
+    except ValueError as e:
+        logging.error(f"Error parsing {filename}: {e}")
+        sys.exit(1)
+    finally:
+        if writer is not None:
+            writer.close()
+            # Don't leave a truncated copy behind to be picked up next time
+            if not completed:
+                os.remove(parquet_filename)
+
+    if num_events < 2:
+        logging.error("Need at least 2 events to analyze transitions.")
+        sys.exit(1)
+
+    if not in_order:
+        return None
+    return trans_counts, dwell_sum, dwell_count
+
+
+def read_events_table(filename):
+    """Read the timestamp and event columns from a CSV or Parquet file.
+
+    The event column is dictionary-encoded in both cases.
+    """
+    try:
+        if filename.endswith(".parquet"):
+            table = pq.read_table(
+                filename, columns=["timestamp", "event"], read_dictionary=["event"]
+            )
+            if table["timestamp"].null_count:
+                logging.error(f"Error parsing {filename}: missing timestamps")
+                sys.exit(1)
+            return table
+        return pacsv.read_csv(
+            filename,
+            read_options=CSV_READ_OPTIONS,
+            convert_options=CSV_CONVERT_OPTIONS,
+        )
+    except FileNotFoundError:
+        logging.error(f"File '{filename}' not found.")
+        sys.exit(1)
+    except KeyError as e:
+        logging.error(f"Required column missing from {filename}: {e}")
+        sys.exit(1)
+    except ValueError as e:
+        logging.error(f"Error parsing {filename}: {e}")
+        sys.exit(1)
+
+
+def load_data(filename, assume_sorted=False):
+    """Load timestamped events from a CSV or Parquet file.
+
+    Returns the timestamps and event codes (see EVENT_CODES, -1 for events
+    we don't model) as two arrays sorted by time. Logs are usually written
+    in order, so they are only sorted if needed, and never with
+    assume_sorted.
+    """
+    table = read_events_table(filename)
+    timestamps = table["timestamp"].to_numpy()
+
+    # Each chunk carries its own dictionary
+    codes = [encode_events(chunk) for chunk in table["event"].chunks]
+    codes = np.concatenate(codes) if codes else np.empty(0, dtype=np.int8)
+
+    if not assume_sorted and np.any(timestamps[1:] < timestamps[:-1]):
+        # A stable sort keeps events with equal timestamps in file order
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, codes = timestamps[order], codes[order]
+
+    return timestamps, codes
+
+
+def accumulate_transitions(timestamps, codes):
+    """Build the same statistics as stream_transitions from in-memory arrays."""
+    if len(timestamps) < 2:
+        logging.error("Need at least 2 events to analyze transitions.")
+        sys.exit(1)
+
+    trans_counts, dwell_sum, dwell_count = new_accumulators()
+    add_transitions(timestamps, codes, trans_counts, dwell_sum, dwell_count)
+
+    return trans_counts, dwell_sum, dwell_count
+
+
+def calculate_state_parameters(trans_counts, dwell_sum, dwell_count):
+    """Calculate parameters for all states from the accumulated statistics.
+
+    Returns a dict of arrays indexed by state code: mean_dwell, rate and
+    sample_size have shape (3,), transition_probs and cumulative_probs have
+    shape (3, 3) with the next action along the second axis. Everything but
+    sample_size is float32, matching the floats on the Arduino.
+    """
+    empty = dwell_count == 0
+    for code in np.flatnonzero(empty):
+        logging.warning(f"No data for state '{EVENT_NAMES[code]}', using defaults")
+
+    # Rows without data divide by zero here; np.where replaces them
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_dwell = np.where(empty, DEFAULT_MEAN_DWELL, dwell_sum / dwell_count)
+        probs = trans_counts / trans_counts.sum(axis=1, keepdims=True)
+    probs = np.where(empty[:, None], DEFAULT_TRANSITION_PROBS, probs)
+    cum_probs = probs.cumsum(axis=1)
+    cum_probs[:, -1] = 1.0
+
+    return {
+        "mean_dwell": mean_dwell.astype(np.float32),
+        "rate": (1.0 / mean_dwell).astype(np.float32),
+        "transition_probs": probs.astype(np.float32),
+        "cumulative_probs": cum_probs.astype(np.float32),
+        "sample_size": dwell_count,
+    }
+
+
+def format_cpp_float(value):
+    """Format a float32 value, or a 1-D array of them, for a C++ literal.
+
+    Uses the shortest decimal that reads back as the same float32, so the
+    MCU ends up with exactly the values computed here.
+    """
+    if np.ndim(value):
+        return [format_cpp_float(v) for v in value]
+    return np.format_float_positional(np.float32(value), trim="0")
+
+
+def generate_cpp_constants(parameters):
+    """Generate C++ header with state-dependent parameters."""
+    parts = [CPP_HEADER]
+
+    # Generate parameters for each state
+    state_defines = ["SCROLL", "LIKE", "DUBIOUS"]
+
+    for code, state_define in enumerate(state_defines):
+        state_params = {
+            name: format_cpp_float(values[code])
+            for name, values in parameters.items()
+            if name != "sample_size"
+        }
+        parts.append(CPP_PER_STATE_TEMPLATE.format(define=state_define, **state_params))
+
+    parts.append(CPP_FOOTER)
+    return "".join(parts)
 
 
 def print_statistics(parameters):
     """Print detailed statistics for each state."""
+    if not logging.getLogger().isEnabledFor(logging.INFO):
+        return
+
     logging.info("=== Semi-Markov Model Results ===")
 
-    for state_name in ["scroll", "like", "dubious_scroll"]:
-        params = parameters[state_name]
+    mean_dwell = parameters["mean_dwell"]
+    probs = parameters["transition_probs"]
+    scroll = EVENT_CODES["scroll"]
+    like = EVENT_CODES["like"]
+    dubious = EVENT_CODES["dubious_scroll"]
+
+    for code, state_name in enumerate(EVENT_NAMES):
         logging.info(f"--- After {state_name.upper()} ---")
-        logging.info(f"Sample size: {params.get('sample_size', 0)} transitions")
-        logging.info(f"Mean dwell time: {params['mean_dwell']:.3f} seconds")
+        logging.info(f"Sample size: {parameters['sample_size'][code]} transitions")
+        logging.info(f"Mean dwell time: {mean_dwell[code]:.3f} seconds")
         logging.info(f"Next action probabilities:")
-        logging.info(f"  scroll: {params['transition_probs']['scroll']:.3f}")
-        logging.info(f"  like: {params['transition_probs']['like']:.3f}")
-        logging.info(
-            f"  dubious_scroll: {params['transition_probs']['dubious_scroll']:.3f}"
-        )
+        for next_code, action in enumerate(EVENT_NAMES):
+            logging.info(f"  {action}: {probs[code, next_code]:.3f}")
 
     # Show behavioral insights
     logging.info("=== Behavioral Insights ===")
 
     # Compare dwell times
-    dwell_after_like = parameters["like"]["mean_dwell"]
-    dwell_after_scroll = parameters["scroll"]["mean_dwell"]
-    dwell_after_dubious = parameters["dubious_scroll"]["mean_dwell"]
+    dwell_after_like = mean_dwell[like]
+    dwell_after_scroll = mean_dwell[scroll]
+    dwell_after_dubious = mean_dwell[dubious]
 
     logging.info("Dwell time comparison:")
     logging.info(f"  After LIKE: {dwell_after_like:.2f}s")
@@ -224,8 +397,8 @@ def print_statistics(parameters):
         logging.info("  → Users watch MORE after dubious scroll (second chance)")
 
     # Compare scroll probabilities
-    scroll_after_like = parameters["like"]["transition_probs"]["scroll"]
-    scroll_after_scroll = parameters["scroll"]["transition_probs"]["scroll"]
+    scroll_after_like = probs[like, scroll]
+    scroll_after_scroll = probs[scroll, scroll]
 
     if scroll_after_like > scroll_after_scroll:
         logging.info(
@@ -238,20 +411,50 @@ def main():
     parser = argparse.ArgumentParser(
         description="Fit a Semi-Markov Model to event data."
     )
-    parser.add_argument("csv_file", help="CSV file with columns: timestamp, event")
+    parser.add_argument(
+        "data_file",
+        help="CSV or Parquet file with columns: timestamp, event",
+    )
+    parser.add_argument(
+        "--assume-sorted",
+        action="store_true",
+        help="skip checking that timestamps are in chronological order",
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="also log the generated header content",
+    )
+    parser.add_argument(
+        "--to-parquet",
+        action="store_true",
+        help="also save a CSV input as Parquet for faster subsequent runs",
+    )
     args = parser.parse_args()
 
-    csv_file = args.csv_file
+    data_file = args.data_file
+    is_parquet = data_file.endswith(".parquet")
+    parquet_filename = None
+    if args.to_parquet and not is_parquet:
+        parquet_filename = os.path.splitext(data_file)[0] + ".parquet"
 
     # Load and analyze data
-    logging.info(f"Loading data from {csv_file}...")
-    events = load_data(csv_file)
-
-    # Analyze state-dependent behavior
-    state_data = analyze_state_dependent_behavior(events)
+    logging.info(f"Loading data from {data_file}...")
+    if is_parquet:
+        stats = accumulate_transitions(*load_data(data_file, args.assume_sorted))
+    else:
+        stats = stream_transitions(data_file, args.assume_sorted, parquet_filename)
+        if stats is None:
+            # Out-of-order timestamps need a full load and sort; a Parquet
+            # copy written by the streaming pass reloads faster than the CSV
+            logging.info("Events are not in chronological order, sorting in memory...")
+            stats = accumulate_transitions(*load_data(parquet_filename or data_file))
+
+    if parquet_filename is not None:
+        logging.info(f"Events saved to {parquet_filename} for faster reloads")
 
     # Calculate parameters for each state
-    parameters = calculate_state_parameters(state_data)
+    parameters = calculate_state_parameters(*stats)
 
     # Print statistics and insights
     print_statistics(parameters)
@@ -261,15 +464,17 @@ def main():
 
     # Output files
     output_filename = "smm_parameters.h"
-    with open(output_filename, "w") as f:
-        f.write(cpp_content)
+    # Binary mode keeps LF line endings on every platform for the Arduino build
+    with open(output_filename, "wb") as f:
+        f.write(cpp_content.encode("ascii"))
 
     logging.info("=== C++ Header File Generated ===")
     logging.info(f"Output written to: {output_filename}")
-    logging.info("Copy the following content to your Arduino sketch:")
-    logging.info("=" * 60)
-    logging.info(cpp_content)
-    logging.info("=" * 60)
+    if args.verbose:
+        logging.info("Copy the following content to your Arduino sketch:")
+        logging.info("=" * 60)
+        logging.info(cpp_content)
+        logging.info("=" * 60)
 
 
 if __name__ == "__main__":